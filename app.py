@@ -1,14 +1,51 @@
 import streamlit as st
+import hashlib
+from collections import deque
 import os
 import tempfile
 from document_processor import DocumentProcessor
-from chatbot import ChatBot
+from chatbot import ChatBot, EMBEDDING_MODEL, EMBEDDING_DTYPE, EMBEDDING_NORMALIZE
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Processed chunks and FAISS indexes, keyed by a hash of the uploaded bytes
+# plus the chunker and embedding settings they were built with
+CACHE_DIR = ".cache"
+
+# Processed documents kept in memory; older ones are reloaded from CACHE_DIR
+MAX_LOADED_DOCUMENTS = 4
+
+# Only the most recent messages are kept (and re-rendered on every rerun)
+MAX_MESSAGES = 50
+
+def cache_name(*parts):
+    """Short file-name-safe key for a combination of cache inputs"""
+    return hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_LOADED_DOCUMENTS)
+def load_document(file_hash, suffix, _file_bytes):
+    """Process a document and build its chatbot once per distinct file content"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    processor = DocumentProcessor()
+    chunks_key = cache_name(file_hash, processor.cache_tag)
+    index_key = cache_name(chunks_key, EMBEDDING_MODEL, EMBEDDING_DTYPE, EMBEDDING_NORMALIZE)
+    
+    # Save uploaded file temporarily
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(_file_bytes)
+        tmp_file_path = tmp_file.name
+    
+    try:
+        chunks = processor.process_document(tmp_file_path, cache_path=os.path.join(CACHE_DIR, f"{chunks_key}.chunks.json"))
+    finally:
+        # Clean up temp file
+        os.unlink(tmp_file_path)
+    
+    return chunks, ChatBot(chunks, index_path=os.path.join(CACHE_DIR, f"{index_key}.faiss"))
+
 def main():
     st.set_page_config(
         page_title="RAG Chatbot",
@@ -23,7 +60,7 @@ def main():
     if "chatbot" not in st.session_state:
         st.session_state.chatbot = None
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = deque(maxlen=MAX_MESSAGES)
     if "document_processed" not in st.session_state:
         st.session_state.document_processed = False
     
@@ -40,25 +77,18 @@ def main():
             if st.button("Process Document", type="primary"):
                 with st.spinner("Processing document..."):
                     try:
-                        # Save uploaded file temporarily
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-                            tmp_file.write(uploaded_file.getvalue())
-                            tmp_file_path = tmp_file.name
-                        
-                        # Process document
-                        processor = DocumentProcessor()
-                        chunks = processor.process_document(tmp_file_path)
-                        # Add this after: chunks = processor.process_document(tmp_file_path)
+                        # Process document (reused if this exact file was seen before)
+                        file_bytes = uploaded_file.getvalue()
+                        file_hash = hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+                        suffix = f".{uploaded_file.name.split('.')[-1]}"
+                        chunks, chatbot = load_document(file_hash, suffix, file_bytes)
                         st.write(f"Debug: Found {len(chunks)} chunks")
                         st.write(f"First chunk preview: {chunks[0][:200]}...")
                         
                         # Initialize chatbot with processed chunks
-                        st.session_state.chatbot = ChatBot(chunks)
+                        st.session_state.chatbot = chatbot
                         st.session_state.document_processed = True
-                        st.session_state.messages = []  # Clear previous messages
-                        
-                        # Clean up temp file
-                        os.unlink(tmp_file_path)
+                        st.session_state.messages = deque(maxlen=MAX_MESSAGES)  # Clear previous messages
                         
                         st.success(f"Document processed! Found {len(chunks)} text chunks.")
                         
@@ -1,20 +1,73 @@
 import streamlit as st
-from sentence_transformers import SentenceTransformer
+from model2vec import StaticModel
 import faiss
+import ahocorasick
 import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
 import logging
+import os
 import re
+import threading
+from collections import OrderedDict
+from functools import cached_property
 from typing import List
 
 logger = logging.getLogger(__name__)
 
+_SENT_SPLIT = re.compile(r'[.!?]+')
+_WS = re.compile(r'\s+')
+_LIST_ITEM = re.compile(r'^(?:[0-9]+\.|[-•])')
+
+def _split_sentences(content: str) -> List[str]:
+    return [s.strip() for s in _SENT_SPLIT.split(content)]
+
+# Above this many chunks the HNSW graph gets expensive to build, so switch
+# to an inverted-file index that only probes a few Voronoi cells per query
+IVF_MIN_CHUNKS = 5000
+IVF_NLIST = 64
+IVF_NPROBE = 8
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+
+# Static (distilled) embeddings: encoding is a token lookup + mean pool.
+# The table is held in fp16 to halve the memory the gather has to touch;
+# NumPy pools fp16 rows with fp32 accumulation.
+EMBEDDING_MODEL = 'minishlab/potion-base-8M'
+EMBEDDING_DTYPE = 'float16'
+# Unit-length output, so inner product equals cosine similarity
+EMBEDDING_NORMALIZE = True
+
+# Questions whose embedding is this close (cosine) to a previously answered
+# one reuse that answer instead of running retrieval and formatting again
+SEMANTIC_CACHE_SIZE = 256
+SEMANTIC_CACHE_THRESHOLD = 0.92
+QUERY_EMBEDDING_CACHE_SIZE = 512
+
+# Upper bound on the retrieved context handed to the answer formatters
+MAX_CONTEXT_CHARS = 1500
+
 class ChatBot:
-    def __init__(self, document_chunks):
-        self.document_chunks = document_chunks
-        self.full_text = " ".join(document_chunks)
+    def __init__(self, document_chunks, index_path=None):
+        # Immutable so the lazily built text indexes below can't go stale
+        self.document_chunks = tuple(document_chunks)
+        # Where the FAISS index is persisted, so reprocessing the same file
+        # can skip embedding entirely
+        self.index_path = index_path
         
         # Initializing  embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model = StaticModel.from_pretrained(
+            EMBEDDING_MODEL,
+            quantize_to=EMBEDDING_DTYPE,
+            normalize=EMBEDDING_NORMALIZE,
+        )
+
+        # Semantic answer cache: row i of _cache_embs holds the normalized
+        # question embedding whose answer is stored under slot i (LRU order)
+        self._cache_embs = None
+        self._cache_answers = OrderedDict()
+        self._qemb_cache = OrderedDict()
+        # The app shares one ChatBot across Streamlit sessions (threads)
+        self._cache_lock = threading.Lock()
         
         # Created vector store if multiple chunks
         if len(document_chunks) > 1:
@@ -22,19 +75,120 @@ class ChatBot:
         else:
             self.use_vector_search = False
     
+    # The full text and the keyword-search indexes built from it are only
+    # needed when the fallback path is taken, so they are built on first use
+    
+    @cached_property
+    def full_text(self) -> str:
+        return " ".join(self.document_chunks)
+    
+    @cached_property
+    def _sentences(self) -> List[str]:
+        return [s.strip() for s in _SENT_SPLIT.split(self.full_text) if s.strip()]
+    
+    @cached_property
+    def _sentences_lower(self) -> List[str]:
+        return [s.lower() for s in self._sentences]
+    
+    @cached_property
+    def _corpus_lower(self) -> str:
+        # Lowercased sentences joined with a sentinel, so phrase matching is a
+        # single pass over the document; match offsets map back via the starts
+        return "\0".join(self._sentences_lower)
+    
+    @cached_property
+    def _sentence_starts(self) -> np.ndarray:
+        return np.cumsum([0] + [len(s) + 1 for s in self._sentences_lower[:-1]])
+    
+    @cached_property
+    def _keyword_index(self):
+        """Sparse sentence x term presence matrix for vectorized keyword scoring"""
+        vectorizer = CountVectorizer(lowercase=True, binary=True, token_pattern=r'(?u)\b\w{3,}\b')
+        try:
+            return vectorizer, vectorizer.fit_transform(self._sentences)
+        except ValueError:
+            # Document has no indexable terms
+            return vectorizer, None
+    
+    def _build_index(self):
+        """Embed all chunks and build the FAISS index over them"""
+        # Encode each distinct chunk once (repeated headers/footers are
+        # common in PDFs) and scatter the rows back to chunk order
+        unique_chunks = list(dict.fromkeys(self.document_chunks))
+        row = {chunk: i for i, chunk in enumerate(unique_chunks)}
+        order = np.fromiter((row[c] for c in self.document_chunks), dtype=np.intp, count=len(self.document_chunks))
+        embeddings = np.asarray(self.embedding_model.encode(unique_chunks), dtype=np.float32)[order]
+        dimension = embeddings.shape[1]
+        # Vectors are stored as fp16, halving index memory and scan traffic
+        if len(self.document_chunks) >= IVF_MIN_CHUNKS:
+            index = faiss.index_factory(dimension, f"IVF{IVF_NLIST},SQfp16", faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = IVF_NPROBE
+        else:
+            index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_fp16, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        if not index.is_trained:
+            index.train(embeddings)
+        index.add(embeddings)
+        return index
+    
+    def _load_index(self):
+        """Load a previously persisted index for these chunks, if there is one"""
+        if not self.index_path or not os.path.exists(self.index_path):
+            return None
+        try:
+            index = faiss.read_index(self.index_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable index cache {self.index_path}: {e}")
+            return None
+        if index.ntotal != len(self.document_chunks) or index.d != self.embedding_model.dim:
+            logger.warning(f"Ignoring index cache {self.index_path} built for different chunks or embeddings")
+            return None
+        logger.info(f"Loaded vector store from {self.index_path}")
+        return index
+    
     def _create_vector_store(self):
        #creating a vector store and using FAISS
         try:
-            embeddings = self.embedding_model.encode(self.document_chunks)
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-            self.index.add(embeddings.astype('float32'))
+            self.index = self._load_index()
+            if self.index is None:
+                self.index = self._build_index()
+                if self.index_path:
+                    # Write then rename so an interrupted run never leaves a
+                    # truncated index behind
+                    tmp_path = f"{self.index_path}.tmp"
+                    faiss.write_index(self.index, tmp_path)
+                    os.replace(tmp_path, self.index_path)
+            
+            # Whitespace cleanup depends only on the chunk, so do it once here
+            # rather than on every retrieval; line breaks are kept for lists.
+            # Most chunks are already clean, so reuse the chunk object then
+            # instead of holding a second copy of the text
+            self._chunk_summary = []
+            for chunk in self.document_chunks:
+                summary = "\n".join(_WS.sub(' ', line).strip() for line in chunk.splitlines() if line.strip())
+                self._chunk_summary.append(chunk if summary == chunk else summary)
             self.use_vector_search = True
             logger.info(f"Vector store created with {len(self.document_chunks)} chunks")
         except Exception as e:
             logger.error(f"Error creating vector store: {e}")
             self.use_vector_search = False
     
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Return the normalized (1, dim) embedding of a query, memoized by its text"""
+        key = query.strip().lower()
+        with self._cache_lock:
+            query_embedding = self._qemb_cache.get(key)
+            if query_embedding is not None:
+                self._qemb_cache.move_to_end(key)
+                return query_embedding
+        
+        query_embedding = np.asarray(self.embedding_model.encode([query]), dtype=np.float32)
+        with self._cache_lock:
+            self._qemb_cache[key] = query_embedding
+            if len(self._qemb_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                self._qemb_cache.popitem(last=False)
+        return query_embedding
+    
     def _find_relevant_content(self, query: str) -> str:
         """Find relevant content using multiple strategies"""
         query_lower = query.lower()
@@ -44,13 +198,29 @@ class ChatBot:
         # Vector search if available
         if hasattr(self, 'use_vector_search') and self.use_vector_search:
             try:
-                query_embedding = self.embedding_model.encode([query])
+                query_embedding = self._encode_query(query)
                 k = min(3, len(self.document_chunks))
-                distances, indices = self.index.search(query_embedding.astype('float32'), k)
-                relevant_chunks = [self.document_chunks[i] for i in indices[0]]
+                scores, indices = self.index.search(query_embedding, k)
+                # Skip near-duplicate chunks (same opening) and stop once the
+                # context budget is spent; ANN indexes pad with -1 when fewer
+                # than k neighbours are found
+                seen = set()
+                relevant_chunks = []
+                budget = MAX_CONTEXT_CHARS
+                for i in indices[0]:
+                    if i < 0:
+                        continue
+                    chunk = self._chunk_summary[i]
+                    if chunk[:64] in seen:
+                        continue
+                    seen.add(chunk[:64])
+                    relevant_chunks.append(chunk)
+                    budget -= len(chunk)
+                    if budget <= 0:
+                        break
                 return " ".join(relevant_chunks)
-            except:
-                pass
+            except Exception as e:
+                logger.error(f"Vector search failed, falling back to keyword search: {e}")
         
         # Strategy 2: Keyword matching with context
         return self._keyword_search_with_context(query_lower)
@@ -61,34 +231,37 @@ class ChatBot:
         # Extract important keywords from query
         query_words = [word for word in query_lower.split() if len(word) > 2]
         
-        # Split document into sentences
-        sentences = re.split(r'[.!?]+', self.full_text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+        sentences = self._sentences
         
-        # Score each sentence based on keyword matches
-        sentence_scores = []
-        for i, sentence in enumerate(sentences):
-            sentence_lower = sentence.lower()
-            score = 0
-            
-            # Count keyword matches
-            for word in query_words:
-                if word in sentence_lower:
-                    score += 1
-            
-            # Bonus for exact phrase matches
-            if any(phrase in sentence_lower for phrase in [query_lower, " ".join(query_words[:2])]):
-                score += 2
-            
-            sentence_scores.append((score, i, sentence))
+        # Score each sentence by the number of query keywords it contains
+        vectorizer, sent_tf = self._keyword_index
+        if sent_tf is not None:
+            query_tf = vectorizer.transform([query_lower])
+            scores = (sent_tf @ query_tf.T).toarray().ravel()
+        else:
+            scores = np.zeros(len(sentences), dtype=np.int64)
         
-        # Sort by score and get top sentences
-        sentence_scores.sort(reverse=True, key=lambda x: x[0])
+        # Bonus for exact phrase matches
+        scores += 2 * self._phrase_hits({query_lower, " ".join(query_words[:2])})
+        
+        # Partial top-k selection: everything above the k-th best score, then
+        # the earliest sentences tied with it; order winners by score and
+        # position, as a stable descending sort would
+        k = min(3, len(scores))
+        if k:
+            kth_score = np.partition(scores, -k)[-k]
+            above = np.flatnonzero(scores > kth_score)
+            tied = np.flatnonzero(scores == kth_score)[:k - len(above)]
+            top_idx = np.concatenate([above, tied])
+            top_idx = top_idx[np.lexsort((top_idx, -scores[top_idx]))]
+        else:
+            top_idx = np.empty(0, dtype=np.intp)
         
         # Get best matching sentences with context
         relevant_sentences = []
-        for score, idx, sentence in sentence_scores[:3]:
-            if score > 0:  # Only include sentences with keyword matches
+        for idx in top_idx:
+            if scores[idx] > 0:  # Only include sentences with keyword matches
+                sentence = sentences[idx]
                 # Add context (previous and next sentence if available)
                 context_sentences = []
                 
@@ -100,9 +273,9 @@ class ChatBot:
                 
                 # Add next sentence if relevant
                 if idx < len(sentences) - 1:
-                    next_sentence = sentences[idx + 1]
-                    if any(word in next_sentence.lower() for word in query_words):
-                        context_sentences.append(next_sentence)
+                    next_sentence_lower = self._sentences_lower[idx + 1]
+                    if any(word in next_sentence_lower for word in query_words):
+                        context_sentences.append(sentences[idx + 1])
                 
                 relevant_sentences.extend(context_sentences)
         
@@ -112,26 +285,44 @@ class ChatBot:
         
         return ". ".join(relevant_sentences[:4]) + "."
     
+    def _phrase_hits(self, phrases) -> np.ndarray:
+        """Return a 0/1 array marking the sentences that contain any of the phrases"""
+        hits = np.zeros(len(self._sentences), dtype=np.int64)
+        
+        # An empty phrase is a substring of every sentence
+        if "" in phrases:
+            hits[:] = 1
+            return hits
+        
+        automaton = ahocorasick.Automaton()
+        for phrase in phrases:
+            automaton.add_word(phrase, phrase)
+        automaton.make_automaton()
+        
+        match_ends = np.fromiter((end for end, _ in automaton.iter(self._corpus_lower)), dtype=np.intp)
+        hits[np.searchsorted(self._sentence_starts, match_ends, side='right') - 1] = 1
+        return hits
+    
     def _format_answer(self, query: str, content: str) -> str:
         """Format the final answer based on query type and content"""
         query_lower = query.lower()
         
         # Handle list-type questions
         if any(word in query_lower for word in ['types', 'list', 'applications', 'kinds', 'examples']):
-            return self._extract_list_format(content, query_lower)
+            return self._extract_list_format(_split_sentences(content), content, query_lower)
         
         # Handle definition questions
         if any(word in query_lower for word in ['what is', 'define', 'definition', 'meaning']):
-            return self._extract_definition(content, query_lower)
+            return self._extract_definition(_split_sentences(content), content)
         
         # Handle "how" questions
         if query_lower.startswith('how'):
-            return self._extract_process(content)
+            return self._extract_process(_split_sentences(content), content)
         
         # Default: return relevant content cleanly
         return self._clean_content(content)
     
-    def _extract_list_format(self, content: str, query: str) -> str:
+    def _extract_list_format(self, sentences: List[str], content: str, query: str) -> str:
         """Extract and format list items"""
         lines = content.split('\n')
         list_items = []
@@ -139,7 +330,7 @@ class ChatBot:
         # Look for numbered or bulleted lists
         for line in lines:
             line = line.strip()
-            if re.match(r'^[0-9]+\.', line) or line.startswith('-') or line.startswith('•'):
+            if _LIST_ITEM.match(line):
                 list_items.append(line)
             elif ':' in line and any(keyword in query for keyword in ['types', 'applications']):
                 if 'include' in line.lower():
@@ -153,21 +344,16 @@ class ChatBot:
             return '\n'.join(list_items)
         
         # Fallback: look for comma-separated items
-        sentences = re.split(r'[.!?]+', content)
         for sentence in sentences:
             if ',' in sentence and any(keyword in sentence.lower() for keyword in ['include', 'are']):
-                return sentence.strip()
+                return sentence
         
         return self._clean_content(content)
     
-    def _extract_definition(self, content: str, query: str) -> str:
+    def _extract_definition(self, sentences: List[str], content: str) -> str:
         """Extract clean definitions"""
-        # Look for definition patterns
-        sentences = re.split(r'[.!?]+', content)
-        
         # Find sentence with "is" or "are" that defines the term
         for sentence in sentences:
-            sentence = sentence.strip()
             if ' is ' in sentence.lower() or ' are ' in sentence.lower():
                 # Check if it's actually defining something
                 if len(sentence) > 20 and not sentence.lower().startswith('there'):
@@ -175,18 +361,16 @@ class ChatBot:
         
         # Fallback to first substantial sentence
         for sentence in sentences:
-            if len(sentence.strip()) > 30:
-                return sentence.strip() + "."
+            if len(sentence) > 30:
+                return sentence + "."
         
         return self._clean_content(content)
     
-    def _extract_process(self, content: str) -> str:
+    def _extract_process(self, sentences: List[str], content: str) -> str:
         """Extract process or method descriptions"""
-        sentences = re.split(r'[.!?]+', content)
         relevant = []
         
         for sentence in sentences:
-            sentence = sentence.strip()
             if any(word in sentence.lower() for word in ['process', 'method', 'work', 'function', 'operate']):
                 relevant.append(sentence)
         
@@ -198,7 +382,7 @@ class ChatBot:
     def _clean_content(self, content: str) -> str:
         """Clean and format content for final output"""
         # Remove extra whitespace and clean up
-        content = re.sub(r'\s+', ' ', content).strip()
+        content = _WS.sub(' ', content).strip()
         
         # Ensure proper sentence ending
         if content and not content.endswith(('.', '!', '?')):
@@ -206,14 +390,50 @@ class ChatBot:
         
         # Limit length
         if len(content) > 500:
-            sentences = re.split(r'[.!?]+', content)
+            sentences = _SENT_SPLIT.split(content)
             content = ". ".join(sentences[:3]) + "."
         
         return content
     
+    def _lookup_cached_answer(self, query_embedding: np.ndarray):
+        """Return the cached answer for a semantically equivalent question, if any"""
+        with self._cache_lock:
+            if not self._cache_answers:
+                return None
+            
+            sims = self._cache_embs[:len(self._cache_answers)] @ query_embedding
+            slot = int(np.argmax(sims))
+            if sims[slot] <= SEMANTIC_CACHE_THRESHOLD:
+                return None
+            
+            self._cache_answers.move_to_end(slot)
+            return self._cache_answers[slot]
+    
+    def _store_cached_answer(self, query_embedding: np.ndarray, answer: str):
+        """Cache an answer, evicting the least recently used one when full"""
+        with self._cache_lock:
+            if self._cache_embs is None:
+                self._cache_embs = np.empty((SEMANTIC_CACHE_SIZE, query_embedding.shape[0]), dtype='float32')
+            
+            # Slots fill up in order, so rows [0, len) are always the live ones
+            if len(self._cache_answers) < SEMANTIC_CACHE_SIZE:
+                slot = len(self._cache_answers)
+            else:
+                slot, _ = self._cache_answers.popitem(last=False)
+            
+            self._cache_embs[slot] = query_embedding
+            self._cache_answers[slot] = answer
+    
     def get_response(self, question: str) -> str:
         """Generate response using improved logic"""
         try:
+            query_embedding = self._encode_query(question)
+            
+            # Repeated or paraphrased questions skip the whole pipeline
+            cached_answer = self._lookup_cached_answer(query_embedding[0])
+            if cached_answer is not None:
+                return cached_answer
+            
             # Find relevant content
             relevant_content = self._find_relevant_content(question)
             
@@ -222,8 +442,9 @@ class ChatBot:
             
             # Final cleanup
             if not answer or len(answer.strip()) < 5:
-                return "I couldn't find relevant information to answer your question. Try rephrasing or asking about different aspects of the document."
+                answer = "I couldn't find relevant information to answer your question. Try rephrasing or asking about different aspects of the document."
             
+            self._store_cached_answer(query_embedding[0], answer)
             return answer
             
         except Exception as e:
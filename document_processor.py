@@ -1,27 +1,140 @@
-import PyPDF2
+import pypdfium2 as pdfium
 import docx
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import blingfire
+import json
 import logging
+import os
+import re
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever _split_text can produce different chunks for the same text,
+# so chunk caches written by older versions are not reused
+CHUNKER_VERSION = 4
+
+# A piece that is only a list marker; blingfire splits "2. Foo" into "2." and "Foo"
+_ENUMERATOR = re.compile(r'^(?:[0-9]+\.|[-•])$')
+
 class DocumentProcessor:
     def __init__(self, chunk_size=200, chunk_overlap=50):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ":", ".", "!", "?", ";", " "]
-        )
+        self._chunk_size = chunk_size
+        self._overlap = chunk_overlap
+    
+    @property
+    def cache_tag(self):
+        """Identifies the chunker settings that cached chunks depend on"""
+        return f"chunker-v{CHUNKER_VERSION}-{self._chunk_size}-{self._overlap}"
+    
+    def _line_sentences(self, line):
+        """Sentence-split one line, keeping list markers with their item"""
+        sentences = []
+        marker = None
+        for sentence in blingfire.text_to_sentences(line).split('\n'):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if marker:
+                sentence = f"{marker} {sentence}"
+                marker = None
+            if _ENUMERATOR.match(sentence):
+                marker = sentence
+            else:
+                sentences.append(sentence)
+        if marker:
+            sentences.append(marker)
+        return sentences
+    
+    def _wrap_sentence(self, sentence):
+        """Split a sentence longer than chunk_size into overlapping windows,
+        breaking between words; only a single over-long token is cut"""
+        pieces = []
+        start = 0
+        while len(sentence) - start > self._chunk_size:
+            end = start + self._chunk_size
+            cut = sentence.rfind(' ', start + 1, end + 1)
+            if cut == -1:
+                cut = end
+            pieces.append(sentence[start:cut].rstrip())
+            
+            # Back up by at most the overlap, then forward to a word start
+            next_start = max(cut - self._overlap, start + 1)
+            if sentence[next_start - 1] != ' ':
+                space = sentence.find(' ', next_start, cut)
+                next_start = space + 1 if space != -1 else cut
+            while next_start < len(sentence) and sentence[next_start] == ' ':
+                next_start += 1
+            start = next_start
+        
+        pieces.append(sentence[start:])
+        return pieces
+    
+    def _split_text(self, text):
+        """Merge sentences into chunks of at most chunk_size characters,
+        repeating up to chunk_overlap characters of trailing sentences.
+        
+        Each line is sentence-split on its own and line breaks are kept
+        between pieces from different lines, so list items stay one per line.
+        """
+        chunks = []
+        window = []  # (separator before it, piece) for each piece in the chunk
+        length = 0   # length of the joined chunk
+        
+        def join(pieces):
+            return pieces[0][1] + "".join(sep + piece for sep, piece in pieces[1:])
+        
+        for line in text.split('\n'):
+            if not line.strip():
+                continue
+            
+            sep = '\n'
+            for sentence in self._line_sentences(line):
+                for piece in self._wrap_sentence(sentence):
+                    if window and length + 1 + len(piece) > self._chunk_size:
+                        chunks.append(join(window))
+                        
+                        # Carry over the trailing sentences that fit in the overlap
+                        carry = []
+                        carried = 0
+                        for prev in reversed(window):
+                            new_length = carried + len(prev[1]) + (1 if carry else 0)
+                            if new_length > self._overlap:
+                                break
+                            carry.append(prev)
+                            carried = new_length
+                        window = carry[::-1]
+                        length = carried
+                        
+                        if window and length + 1 + len(piece) > self._chunk_size:
+                            window = []
+                            length = 0
+                    
+                    length += len(piece) + (1 if window else 0)
+                    window.append((sep, piece))
+                    sep = ' '
+        
+        if window:
+            chunks.append(join(window))
+        return chunks
+    
     def extract_text_from_pdf(self, file_path):
         """Extract text from PDF file"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                pages = []
+                for page in pdf:
+                    try:
+                        textpage = page.get_textpage()
+                        try:
+                            # PDFium reports line breaks as \r\n
+                            pages.append(textpage.get_text_bounded().replace("\r\n", "\n"))
+                        finally:
+                            textpage.close()
+                    finally:
+                        page.close()
+                return "\n".join(pages)
+            finally:
+                pdf.close()
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
             raise e
@@ -30,10 +143,7 @@ class DocumentProcessor:
         """Extract text from Word document"""
         try:
             doc = docx.Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs)
         except Exception as e:
             logger.error(f"Error extracting text from DOCX: {e}")
             raise e
@@ -47,8 +157,18 @@ class DocumentProcessor:
             logger.error(f"Error extracting text from TXT: {e}")
             raise e
     
-    def process_document(self, file_path):
-        """Process document and return text chunks"""
+    def process_document(self, file_path, cache_path=None):
+        """Process document and return text chunks
+        
+        If cache_path is given, chunks are read from it when present and
+        written to it otherwise.
+        """
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as file:
+                chunks = json.load(file)
+            logger.info(f"Loaded {len(chunks)} cached chunks from {cache_path}")
+            return chunks
+        
         file_extension = file_path.split('.')[-1].lower()
         
         # Extract text based on file type
@@ -65,8 +185,14 @@ class DocumentProcessor:
             raise ValueError("No text content found in the document")
         
         # Split text into chunks
-        chunks = self.text_splitter.split_text(text)
+        chunks = self._split_text(text)
         logger.info(f"Document processed into {len(chunks)} chunks")
         
+        if cache_path:
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(chunks, file)
+            os.replace(tmp_path, cache_path)
+        
         return chunks
 